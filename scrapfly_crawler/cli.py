@@ -61,5 +61,14 @@ async def main() -> None:
         logger.error(f"Crawl failed: {str(e)}")
         sys.exit(1)
 
+def run() -> None:
+    """Run the CLI on uvloop when it is installed, falling back to the default event loop"""
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
+
 if __name__ == '__main__':
-    asyncio.run(main())
+    run()
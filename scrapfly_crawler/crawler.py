@@ -1,22 +1,62 @@
+import atexit
 import logging
 import asyncio
-import json
-import random
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Tuple, List, Union
+import orjson
+from requests.adapters import HTTPAdapter
 from scrapfly import ScrapflyClient
-from .tracker import LinkTracker
+from .tracker import LinkTracker, FLUSH_SECONDS
 from .rate_limiter import RateLimiter
 from .scraper import scrape_url
-from .utils import normalize_domain, urlparse, urlunparse
+from .utils import canonicalize_url, normalize_domain, urlparse, urlunparse
 from .models import CrawlStatus
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of results serialized and written per output write
+WRITE_BATCH_SIZE = 64
+
+def _write_records(f, records: List[dict]) -> None:
+    """Serialize records as JSONL and write them in one call (runs in a worker thread)"""
+    f.write(b''.join(orjson.dumps(record) + b'\n' for record in records))
+    f.flush()
+
+def _normalize_start_url(start_url: str) -> Tuple[str, str]:
+    """Parse the start URL once, returning it without fragment together with its netloc"""
+    # For problematic domains like those with Namecheap URL forwarding,
+    # ensure we try HTTP version first, which often works better with redirects
+    if not start_url.startswith(('http://', 'https://')):
+        # If no scheme specified, start with HTTP
+        start_url = f"http://{start_url}"
+    # Preserve the scheme but ensure it's normalized
+    parsed = urlparse(start_url)
+    normalized_url = urlunparse((parsed.scheme, parsed.netloc, parsed.path, parsed.params, parsed.query, ''))
+    return normalized_url, parsed.netloc
+
+def _size_connection_pool(client: ScrapflyClient, size: int) -> None:
+    """Let the client run up to size requests at once and keep their connections alive"""
+    # async_scrape runs the blocking scrape in the client's executor, whose
+    # default thread count (min(32, cpus + 4)) would cap concurrency below size;
+    # max_concurrency only applies to concurrent_scrape
+    if client.async_executor is not None:
+        client.async_executor.shutdown(wait=False)
+    client.async_executor = ThreadPoolExecutor(max_workers=size)
+    # requests keeps only 10 connections per host by default and discards the
+    # rest after use, which forces new TLS handshakes at higher concurrency
+    if client.http_session is None:
+        return
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+    client.http_session.mount('https://', adapter)
+    client.http_session.mount('http://', adapter)
+
 class Crawler:
     def __init__(self, api_key: str, concurrent_requests: int = 1):
-        self.client = ScrapflyClient(key=api_key)
+        self.client = ScrapflyClient(key=api_key, max_concurrency=concurrent_requests)
         self.concurrent_requests = concurrent_requests
 
     async def crawl(self, start_url: str, output_dir: Union[str, Path, None] = None, resume: bool = False, exclude_patterns: Optional[List[str]] = None) -> Tuple[Path, Path]:
@@ -32,24 +72,16 @@ class Crawler:
         Returns:
             Tuple of (output_file, state_file) Path objects
         """
-        # For problematic domains like those with Namecheap URL forwarding,
-        # ensure we try HTTP version first, which often works better with redirects
+        normalized_url, netloc = _normalize_start_url(start_url)
         if not start_url.startswith(('http://', 'https://')):
-            # If no scheme specified, start with HTTP
-            parsed = urlparse(f"http://{start_url}")
-            normalized_url = urlunparse((parsed.scheme, parsed.netloc, parsed.path, parsed.params, parsed.query, ''))
             logger.info(f"No scheme specified, starting with HTTP: {normalized_url}")
-        else:
-            # Preserve the scheme but ensure it's normalized
-            parsed = urlparse(start_url)
-            normalized_url = urlunparse((parsed.scheme, parsed.netloc, parsed.path, parsed.params, parsed.query, ''))
         
         # Setup output directory
         output_dir_path = Path(output_dir or "output")
         output_dir_path.mkdir(exist_ok=True)
         
         # Extract just the domain name for filenames
-        domain = normalize_domain(urlparse(normalized_url).netloc)
+        domain = normalize_domain(netloc)
         
         # For resume, always try to find existing files first
         state_files = list(output_dir_path.glob(f"{domain}_*.state.json"))
@@ -67,66 +99,127 @@ class Crawler:
             state_file = output_dir_path / f"{domain}_{date_str}.state.json"
         
         # Initialize components
-        tracker = LinkTracker(normalized_url, state_file=state_file, exclude_patterns=exclude_patterns)
+        near_duplicate_distance = os.getenv('NEAR_DUPLICATE_DISTANCE')
+        tracker = LinkTracker(
+            normalized_url,
+            state_file=state_file,
+            exclude_patterns=exclude_patterns,
+            near_duplicate_distance=int(near_duplicate_distance) if near_duplicate_distance else None
+        )
         rate_limiter = RateLimiter(initial_concurrency=self.concurrent_requests)
         
         logger.info(f"{'Resuming' if resume else 'Starting'} crawl of {start_url}")
         logger.debug(f"Output will be saved to: {output_file}")
         logger.debug(f"State will be saved to: {state_file}")
         
-        # Open output file in append mode for resuming
-        with open(output_file, 'a', encoding='utf-8') as f:
-            # Process initial URL if not already completed
-            if normalized_url not in tracker.get_completed_links():
-                result_data = await scrape_url(self.client, normalized_url, tracker, rate_limiter)
-                if result_data:
-                    logger.debug(f"Writing data for URL: {normalized_url}")
-                    f.write(json.dumps(result_data) + '\n')
-            
-            # Process pending links with dynamic concurrency
-            while tracker.get_pending_links():
-                # Get pending links, which will already filter out excluded URLs
-                pending_links = list(tracker.get_pending_links())[:rate_limiter.concurrency]
-                
-                if not pending_links:
-                    # No valid pending links after filtering
-                    break
-                    
-                # Mark links as in progress
-                for url in pending_links:
-                    tracker.update_status(url, CrawlStatus.IN_PROGRESS)
-                
-                tasks = [scrape_url(self.client, url, tracker, rate_limiter)
-                        for url in pending_links]
-                
-                try:
-                    results = await asyncio.gather(*tasks, return_exceptions=True)
-                    
-                    # Handle results and write successful ones to file
-                    for url, result_data in zip(pending_links, results):
-                        if isinstance(result_data, Exception):
-                            logger.error(f"Task failed with error: {str(result_data)}")
-                            tracker.update_status(url, CrawlStatus.FAILED, str(result_data))
-                            continue
+        # Keep one pooled HTTP session open for the whole crawl so connections
+        # to the Scrapfly API are reused; open output file in append mode for resuming.
+        # Pages are parsed for links in worker processes to keep the event loop free;
+        # forking them once threads exist can deadlock, so they start from a clean process
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        parse_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context(start_method))
+        with self.client, open(output_file, 'ab') as f, parse_pool:
+            queue: asyncio.Queue = asyncio.Queue()
+            write_queue: asyncio.Queue = asyncio.Queue()
+
+            # Process initial URL if not already completed, then any pending links;
+            # queue it by its tracker key so it isn't tracked a second time
+            start_url_key = canonicalize_url(normalized_url)
+            start_status = tracker.get_status(start_url_key)
+            if start_status is None:
+                tracker.add_link(start_url_key)
+            elif start_status in (CrawlStatus.FAILED, CrawlStatus.IN_PROGRESS):
+                queue.put_nowait(start_url_key)
+            for url in tracker.pop_pending():
+                queue.put_nowait(url)
+
+            async def worker() -> None:
+                while True:
+                    url = await queue.get()
+                    try:
+                        tracker.update_status(url, CrawlStatus.IN_PROGRESS)
+                        try:
+                            async with rate_limiter:
+                                result_data = await scrape_url(self.client, url, tracker, rate_limiter, parse_pool)
+                        except Exception as e:
+                            logger.error(f"Task failed with error: {str(e)}")
+                            tracker.update_status(url, CrawlStatus.FAILED, str(e))
+                            result_data = None
+
                         if isinstance(result_data, dict):
                             logger.debug(f"Writing data for URL: {result_data['url']}")
-                            f.write(json.dumps(result_data) + '\n')
+                            write_queue.put_nowait(result_data)
                             tracker.update_status(url, CrawlStatus.COMPLETED)
-                    
-                    # Add delay between batches to prevent rate limiting
-                    await asyncio.sleep(random.uniform(3, 5))
-                    
-                except Exception as e:
-                    logger.error(f"Batch processing failed: {str(e)}")
-                    # Save state on error to allow resuming
-                    tracker.save_state()
-                    raise
+
+                        # Hand newly discovered links to the pool
+                        for new_url in tracker.pop_pending():
+                            queue.put_nowait(new_url)
+
+                        # Slow down while the site is returning errors
+                        await rate_limiter.maybe_backoff()
+                    finally:
+                        queue.task_done()
+
+            async def writer() -> None:
+                # Batch whatever results are waiting and write them off the
+                # event loop; a None sentinel marks the end of the crawl
+                loop = asyncio.get_event_loop()
+                while True:
+                    batch = [await write_queue.get()]
+                    while len(batch) < WRITE_BATCH_SIZE and not write_queue.empty():
+                        batch.append(write_queue.get_nowait())
+                    records = [record for record in batch if record is not None]
+                    if records:
+                        await loop.run_in_executor(None, _write_records, f, records)
+                    if batch[-1] is None:
+                        return
+
+            async def flusher() -> None:
+                # Write out buffered state updates even while no URL changes
+                # arrive, e.g. during a long Retry-After pause
+                while True:
+                    await asyncio.sleep(FLUSH_SECONDS)
+                    tracker.flush_state()
+
+            # Spawn enough workers for the highest concurrency the rate limiter
+            # may allow; it admits only as many requests as currently permitted
+            pool_size = max(1, rate_limiter.concurrency, rate_limiter.max_concurrency)
+            _size_connection_pool(self.client, pool_size)
+            workers = [asyncio.create_task(worker()) for _ in range(pool_size)]
+            writer_task = asyncio.create_task(writer())
+            flusher_task = asyncio.create_task(flusher())
+            # Last resort for buffered updates if the interpreter exits mid-crawl
+            atexit.register(tracker.flush_state)
+            try:
+                # Finish once every queued URL is processed; a worker or the
+                # writer only exits early when something broke, so surface that
+                join = asyncio.ensure_future(queue.join())
+                done, _ = await asyncio.wait([join, writer_task, *workers], return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task is not join:
+                        join.cancel()
+                        task.result()
+            except BaseException:
+                # Save state on error or interruption to allow resuming
+                tracker.save_state()
+                raise
+            finally:
+                atexit.unregister(tracker.flush_state)
+                for task in [*workers, flusher_task]:
+                    task.cancel()
+                await asyncio.gather(*workers, flusher_task, return_exceptions=True)
+                # Flush results still waiting for the writer
+                write_queue.put_nowait(None)
+                await writer_task
+        
+        # Fold the update log into a final snapshot
+        tracker.compact()
         
         # Log final statistics
         logger.info(f"\nCrawl statistics for {tracker.domain}:")
-        logger.info(f"Completed: {len(tracker.get_completed_links())}")
-        logger.info(f"Pending: {len(tracker.get_pending_links())}")
-        logger.info(f"Failed: {len(tracker.get_failed_links())}")
+        logger.info(f"Completed: {tracker.count_links(CrawlStatus.COMPLETED)}")
+        logger.info(f"Pending: {tracker.count_links(CrawlStatus.PENDING)}")
+        logger.info(f"Failed: {tracker.count_links(CrawlStatus.FAILED)}")
         logger.info(f"Excluded: {tracker.get_excluded_count()}")
         if tracker.exclude_patterns:
             logger.info(f"Exclude patterns used: {', '.join(tracker.exclude_patterns)}")
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
-import json
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Set
+from typing import Dict, List
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import urlparse
+import orjson
 
 # Import only what we need
 from enum import Enum
@@ -61,44 +62,40 @@ class LinkTracker:
         if not self.state_file:
             return
             
+        # orjson serializes LinkMetadata, CrawlStatus and datetime values natively
         state = {
             'base_url': self.base_url,
             'domain': self.domain,
-            'links': {
-                url: {
-                    'url': metadata.url,
-                    'status_code': metadata.status_code,
-                    'content_type': metadata.content_type,
-                    'crawled_at': metadata.crawled_at.isoformat() if metadata.crawled_at else None,
-                    'error': metadata.error,
-                    'proxy_country': metadata.proxy_country,
-                    'render_js': metadata.render_js,
-                    'timing': metadata.timing,
-                    'scrape_params': metadata.scrape_params,
-                    'final_url': metadata.final_url,
-                    'redirect_chain': metadata.redirect_chain,
-                    'is_redirected': metadata.is_redirected
-                }
-                for url, metadata in self.links.items()
-            },
-            'status': {url: status.value for url, status in self.status.items()},
-            'discovered_at': {url: dt.isoformat() for url, dt in self.discovered_at.items()}
+            'links': self.links,
+            'status': self.status,
+            'discovered_at': self.discovered_at
         }
         
-        self.state_file.write_text(json.dumps(state))
+        self.state_file.write_bytes(orjson.dumps(state))
 
-def process_jsonl_files(output_dir: Path) -> Dict[str, Set[dict]]:
-    """Process all JSONL files and group entries by domain"""
-    domain_entries = defaultdict(set)
+def parse_jsonl_file(jsonl_file: Path) -> List[dict]:
+    """Parse a JSONL file into entries, dropping page HTML"""
+    entries = []
+    with jsonl_file.open('rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = orjson.loads(line)
+            # HTML is not part of the state; don't ship it back to the parent process
+            entry.pop("html", None)
+            entries.append(entry)
+    return entries
+
+def process_jsonl_files(output_dir: Path) -> Dict[str, Dict[str, dict]]:
+    """Process all JSONL files in parallel and group entries by domain, keeping the first entry per URL"""
+    domain_entries: Dict[str, Dict[str, dict]] = defaultdict(dict)
     
-    for jsonl_file in output_dir.glob("*.jsonl"):
-        with jsonl_file.open() as f:
-            for line in f:
-                entry = json.loads(line)
+    with ProcessPoolExecutor() as executor:
+        for entries in executor.map(parse_jsonl_file, list(output_dir.glob("*.jsonl"))):
+            for entry in entries:
                 url = entry.get("url")
                 if url:
-                    domain = get_domain(url)
-                    domain_entries[domain].add(json.dumps(entry))  # Use JSON string as it's hashable
+                    domain_entries[get_domain(url)].setdefault(url, entry)
                     
     return domain_entries
 
@@ -111,12 +108,10 @@ def create_state_files(output_dir: Path):
         state_file = output_dir / f"{domain}.state.json"
         
         # Initialize tracker with first URL for the domain
-        first_entry = json.loads(next(iter(entries)))
-        tracker = LinkTracker(first_entry["url"], state_file)
+        tracker = LinkTracker(next(iter(entries)), state_file)
         
         # Process all entries for this domain
-        for entry_json in entries:
-            entry = json.loads(entry_json)
+        for entry in entries.values():
             url = entry["url"]
             
             # Create metadata
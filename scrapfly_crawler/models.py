@@ -1,56 +1,91 @@
 import os
+import sys
 from enum import Enum
-from typing import Dict, Optional
-from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+from dataclasses import dataclass, fields
 from datetime import datetime
+from functools import lru_cache
 
 __all__ = ['CrawlStatus', 'LinkMetadata']
 
+@lru_cache(maxsize=None)
+def default_scrape_params() -> Mapping:
+    """Default scrape parameters shared by all links, built once on first use.
+    
+    Built lazily rather than at import so RENDER_JS from a .env file loaded
+    by the CLI is honored.
+    """
+    # Check if render_js is set in environment variables
+    render_js_env = os.getenv('RENDER_JS')
+    render_js = render_js_env.lower() == 'true' if render_js_env is not None else False
+    
+    return MappingProxyType({
+        "render_js": render_js,  # Default is False unless overridden by env var
+        "asp": True,
+        "debug": True,
+        "method": "GET",  # Use GET method to handle redirects naturally
+        "headers": {
+            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+            "Accept-Language": "de-DE,de;q=0.9,en-US;q=0.8,en;q=0.7",
+            "Accept-Encoding": "gzip, deflate, br",
+            "Cache-Control": "no-cache",
+            "Pragma": "no-cache",
+            "Sec-Ch-Ua": '"Chromium";v="122", "Not(A:Brand";v="24", "Google Chrome";v="122"',
+            "Sec-Ch-Ua-Mobile": "?0",
+            "Sec-Ch-Ua-Platform": '"macOS"',
+            "Sec-Fetch-Dest": "document",
+            "Sec-Fetch-Mode": "navigate",
+            "Sec-Fetch-Site": "none",
+            "Sec-Fetch-User": "?1"
+        }
+    })
+
 class CrawlStatus(Enum):
     PENDING = "pending"
     IN_PROGRESS = "in_progress"
     COMPLETED = "completed"
     FAILED = "failed"
 
-@dataclass
+# Slots drop the per-instance __dict__, which dominates memory on large
+# crawls; dataclasses only support them from Python 3.10
+_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+def _add_slots(cls: type) -> type:
+    """Rebuild a dataclass with __slots__ on Pythons whose dataclass can't"""
+    if _SLOTS:
+        return cls
+    # Defaults live in the generated __init__, so the class attributes that
+    # would clash with the slot descriptors can be dropped
+    names = tuple(f.name for f in fields(cls))
+    cls_dict = {k: v for k, v in cls.__dict__.items() if k not in names + ('__dict__', '__weakref__')}
+    cls_dict['__slots__'] = names
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+@_add_slots
+@dataclass(**_SLOTS)
 class LinkMetadata:
     url: str
     status_code: Optional[int] = None
     content_type: Optional[str] = None
-    crawled_at: Optional[datetime] = None
+    crawled_at: Optional[int] = None  # time.time_ns() when the page was crawled
     error: Optional[str] = None
     proxy_country: Optional[str] = None
     render_js: Optional[bool] = None
     timing: Optional[Dict] = None
-    scrape_params: Dict = None
+    scrape_params_override: Optional[Dict] = None  # Per-link changes to default_scrape_params()
     final_url: Optional[str] = None  # URL after following redirects
-    redirect_chain: Optional[list] = None  # List of URLs in redirect chain
+    redirect_chain: Optional[Tuple[str, ...]] = None  # URLs in redirect chain
     is_redirected: bool = False  # Flag indicating if URL was redirected
+    status: CrawlStatus = CrawlStatus.PENDING
+    discovered_at: Optional[int] = None  # time.time_ns() when the link was found
+
+    @property
+    def crawled_at_dt(self) -> Optional[datetime]:
+        """crawled_at as a local datetime, for display and output"""
+        return datetime.fromtimestamp(self.crawled_at / 1e9) if self.crawled_at is not None else None
 
-    def __post_init__(self):
-        if self.scrape_params is None:
-            # Check if render_js is set in environment variables
-            render_js_env = os.getenv('RENDER_JS')
-            render_js = render_js_env.lower() == 'true' if render_js_env is not None else False
-            
-            self.scrape_params = {
-                "render_js": render_js,  # Default is False unless overridden by env var
-                "asp": True,
-                "debug": True,
-                "method": "GET",  # Use GET method to handle redirects naturally
-                "headers": {
-                    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                    "Accept-Language": "de-DE,de;q=0.9,en-US;q=0.8,en;q=0.7",
-                    "Accept-Encoding": "gzip, deflate, br",
-                    "Cache-Control": "no-cache",
-                    "Pragma": "no-cache",
-                    "Sec-Ch-Ua": '"Chromium";v="122", "Not(A:Brand";v="24", "Google Chrome";v="122"',
-                    "Sec-Ch-Ua-Mobile": "?0",
-                    "Sec-Ch-Ua-Platform": '"macOS"',
-                    "Sec-Fetch-Dest": "document",
-                    "Sec-Fetch-Mode": "navigate",
-                    "Sec-Fetch-Site": "none",
-                    "Sec-Fetch-User": "?1"
-                }
-            }
+    def effective_scrape_params(self) -> Dict:
+        """Scrape parameters for this link: the shared defaults plus any overrides"""
+        return {**default_scrape_params(), **(self.scrape_params_override or {})}
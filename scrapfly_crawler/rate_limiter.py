@@ -1,31 +1,168 @@
 import asyncio
 import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import Optional
 
+# Number of recent responses used to compute the error rate
+ERROR_WINDOW = 10
+# Error rate above which workers back off after each request
+ERROR_RATE_THRESHOLD = 0.2
+# Factor applied to the concurrency window on a rate limit response
+DECREASE_FACTOR = 0.5
+# Minimum number of seconds between two decreases, so a burst of 429s from
+# requests that were already in flight counts as a single congestion signal
+DECREASE_COOLDOWN = 2.0
+
 class RateLimiter:
     def __init__(self, initial_concurrency=None):
         # Get values from environment variables or use defaults
-        self.concurrency = initial_concurrency or int(os.getenv('INITIAL_CONCURRENCY', 1))
-        self.last_retry_after = None
         self.consecutive_429s = 0
         self.min_concurrency = int(os.getenv('MIN_CONCURRENCY', 1))
         self.max_concurrency = int(os.getenv('MAX_CONCURRENCY', 1))
+        # Concurrency window adjusted with AIMD: additive increase of 1/cwnd per
+        # success (about +1 per window), halved on rate limits; never below one
+        # request so the increase stays defined
+        self._min_cwnd = float(max(1, self.min_concurrency))
+        self.cwnd = max(self._min_cwnd, float(initial_concurrency or int(os.getenv('INITIAL_CONCURRENCY', 1))))
+        self._last_decrease = float('-inf')
         self.base_delay = int(os.getenv('BASE_DELAY', 5))
+        self.max_backoff = float(os.getenv('MAX_BACKOFF', 60))
+        # Rolling window of recent responses (True for 429/5xx) driving backpressure
+        self._recent_errors = deque(maxlen=ERROR_WINDOW)
+        self.consecutive_errors = 0
+        # Token bucket: one request permit every 1/requests_per_second seconds (0 disables)
+        self.requests_per_second = float(os.getenv('REQUESTS_PER_SECOND', 1))
+        self._next_permit_at = 0.0
+        # Admission control: number of requests currently in flight, guarded by
+        # a condition so concurrency changes take effect without draining
+        self._active = 0
+        self._cond = asyncio.Condition()
+        # Retry-After gate shared by all requests: cleared until the loop time
+        # in _retry_until so every worker waits out the same deadline
+        self._open = asyncio.Event()
+        self._open.set()
+        self._retry_until = 0.0
+
+    @property
+    def concurrency(self) -> int:
+        """Number of requests currently allowed in flight"""
+        return max(1, int(self.cwnd))
+
+    @concurrency.setter
+    def concurrency(self, value: int):
+        self.cwnd = max(self._min_cwnd, float(value))
+
+    async def acquire(self):
+        """Wait for a free request slot under the current concurrency limit"""
+        async with self._cond:
+            while self._active >= self.concurrency:
+                await self._cond.wait()
+            self._active += 1
+
+    async def release(self):
+        """Free a request slot and wake up waiters for every slot now available"""
+        async with self._cond:
+            self._active -= 1
+            # Concurrency may have grown while requests were in flight
+            self._cond.notify(max(0, self.concurrency - self._active))
+
+    async def wait_for_permit(self):
+        """Wait until the token bucket releases the next request permit"""
+        if self.requests_per_second <= 0:
+            return
+        now = asyncio.get_event_loop().time()
+        # Reserve the next free permit slot before sleeping so concurrent
+        # callers line up one interval apart
+        permit_at = max(now, self._next_permit_at)
+        self._next_permit_at = permit_at + 1 / self.requests_per_second
+        if permit_at > now:
+            await asyncio.sleep(permit_at - now)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    @property
+    def error_rate(self) -> float:
+        """Share of 429/5xx responses among the most recent requests"""
+        if not self._recent_errors:
+            return 0.0
+        return sum(self._recent_errors) / len(self._recent_errors)
+
+    async def maybe_backoff(self):
+        """Back off exponentially while the recent error rate is high, otherwise just yield"""
+        if self.error_rate > ERROR_RATE_THRESHOLD:
+            await asyncio.sleep(min(self.max_backoff, self.base_delay * (2 ** self.consecutive_errors)))
+        else:
+            await asyncio.sleep(0)
+
+    @staticmethod
+    def parse_retry_after(retry_after: str) -> Optional[float]:
+        """Parse a Retry-After header given in seconds or as an HTTP date"""
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        if retry_at is None:
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    def _close_until(self, delay: float):
+        """Hold back all requests for delay seconds"""
+        loop = asyncio.get_event_loop()
+        retry_until = loop.time() + delay
+        if retry_until <= self._retry_until:
+            return
+        self._retry_until = retry_until
+        # While the gate is closed its pending timer picks up the new deadline
+        if self._open.is_set():
+            self._open.clear()
+            loop.call_later(delay, self._reopen)
+
+    def _reopen(self):
+        # Timers may fire up to the loop's clock resolution early, and a later
+        # Retry-After may have pushed the deadline out: wait for the remainder
+        loop = asyncio.get_event_loop()
+        remaining = self._retry_until - loop.time()
+        if remaining > 0:
+            loop.call_later(remaining, self._reopen)
+        else:
+            self._open.set()
 
     def update_concurrency(self, status_code: int, retry_after: Optional[str] = None):
+        is_error = status_code == 429 or status_code >= 500
+        self._recent_errors.append(is_error)
+        self.consecutive_errors = self.consecutive_errors + 1 if is_error else 0
+        
         if status_code == 429:
             self.consecutive_429s += 1
-            # Reduce concurrency on rate limits
-            self.concurrency = max(self.min_concurrency, self.concurrency - 1)
+            # Multiplicative decrease on rate limits, at most once per cooldown
+            now = time.monotonic()
+            if now - self._last_decrease >= DECREASE_COOLDOWN:
+                self.cwnd = max(self._min_cwnd, self.cwnd * DECREASE_FACTOR)
+                self._last_decrease = now
             if retry_after:
-                self.last_retry_after = float(retry_after)
+                delay = self.parse_retry_after(retry_after)
+                if delay:
+                    self._close_until(delay)
         else:
             self.consecutive_429s = 0
-            # Gradually increase concurrency on success
-            if self.consecutive_429s == 0:
-                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            # Additive increase on success
+            self.cwnd = min(float(self.max_concurrency), self.cwnd + 1 / self.cwnd)
 
     async def wait_if_needed(self):
-        if self.last_retry_after:
-            await asyncio.sleep(self.last_retry_after)
-            self.last_retry_after = None
+        """Wait until the latest Retry-After deadline has passed"""
+        if not self._open.is_set():
+            await self._open.wait()
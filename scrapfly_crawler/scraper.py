@@ -1,148 +1,211 @@
 import logging
 import asyncio
 import random
+import re
 import os
-from typing import Dict, Optional
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import Dict, Optional, Sequence, Set, Tuple
+import lxml.html
+from lxml import etree
+from parsel import Selector
 from scrapfly import ScrapflyClient, ScrapeConfig
 from .tracker import LinkTracker
 from .rate_limiter import RateLimiter
-from .utils import filter_links, should_exclude_url
-from .models import LinkMetadata, CrawlStatus
+from .utils import filter_links, simhash, urlparse
+from .models import CrawlStatus
 
 logger = logging.getLogger(__name__)
 
-async def scrape_with_retry(client: ScrapflyClient, url: str, scrape_params: Dict, max_retries=None, base_delay=None):
-    """Scrape a URL with retry logic for network and server errors only."""
-    max_retries = max_retries or int(os.getenv('MAX_RETRIES', 3))
-    base_delay = base_delay or int(os.getenv('BASE_DELAY', 10))
-    timeout = int(os.getenv('SCRAPE_TIMEOUT', 30))  # Default 30 seconds timeout
-    last_error = None
+# URL path extensions and response content types that are not crawled
+_BINARY_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.mp4', '.mp3', '.pdf', '.zip')
+_BINARY_CONTENT_TYPE_RE = re.compile(r'(?:image|video|audio)/|application/octet-stream', re.IGNORECASE)
+
+def _is_binary_url(url: str) -> bool:
+    """Check whether the URL path ends in a binary file extension"""
+    return urlparse(url).path.lower().endswith(_BINARY_EXTENSIONS)
+
+@lru_cache(maxsize=None)
+def _retry_settings() -> Tuple[int, int, int, float]:
+    """Read (max_retries, base_delay, timeout, max_backoff) from the environment.
+    
+    Read on first use rather than at import so values from a .env file
+    loaded by the CLI are picked up.
+    """
+    return (
+        int(os.getenv('MAX_RETRIES', 3)),
+        int(os.getenv('BASE_DELAY', 10)),
+        int(os.getenv('SCRAPE_TIMEOUT', 30)),  # Default 30 seconds timeout
+        float(os.getenv('MAX_BACKOFF', 60)),
+    )
+
+# Which failures scrape_with_retry retries or works around; anything not
+# covered here (including 4xx responses) is returned as is
+RETRY_POLICY = {
+    'retry_5xx': True,                 # Retry server errors
+    'retry_429': True,                 # Retry rate limits after their retry-after delay
+    'retry_timeout': True,             # Retry scrapes that time out
+    'http_fallback_on_timeout': True,  # Try plain HTTP once when an HTTPS URL times out
+    'follow_301_manually': True,       # Follow 301s ourselves (e.g. Namecheap URL forwarding)
+}
+
+async def scrape_with_retry(client: ScrapflyClient, url: str, scrape_params: Dict, max_retries=None, base_delay=None,
+                            policy: Optional[Dict[str, bool]] = None, rate_limiter: Optional[RateLimiter] = None):
+    """Scrape a URL with retry logic for network and server errors only.
+    
+    If a rate limiter is given, every request, including retries, fallbacks and
+    followed redirects, waits for its Retry-After gate and a token bucket
+    permit, and reports its response to it, so retried 429s still slow the
+    crawl down.
+    """
+    default_retries, default_delay, timeout, max_backoff = _retry_settings()
+    max_retries = max_retries or default_retries
+    base_delay = base_delay or default_delay
+    policy = RETRY_POLICY if policy is None else {**RETRY_POLICY, **policy}
+
+    async def fetch(target: str):
+        if rate_limiter is not None:
+            await rate_limiter.wait_if_needed()
+            await rate_limiter.wait_for_permit()
+        result = await asyncio.wait_for(client.async_scrape(ScrapeConfig(url=target, **scrape_params)), timeout=timeout)
+        if rate_limiter is not None:
+            rate_limiter.update_concurrency(result.response.status_code, result.response.headers.get('retry-after'))
+        return result
+
+    # Delay requested by the server for the next attempt (from retry-after)
+    retry_after_delay = None
 
     for attempt in range(max_retries):
+        last_attempt = attempt == max_retries - 1
         try:
             # Add delay between attempts
             if attempt > 0:
-                delay = base_delay * (2 ** attempt) + random.uniform(1, 3)
-                logger.debug(f"Waiting {delay:.2f}s before retry {attempt + 1}")
+                if retry_after_delay is not None:
+                    delay, retry_after_delay = retry_after_delay, None
+                else:
+                    # Full jitter keeps concurrent workers from retrying in lockstep
+                    delay = random.uniform(0, min(max_backoff, base_delay * (2 ** attempt)))
+                logger.debug("Waiting %.2fs before retry %d", delay, attempt + 1)
                 await asyncio.sleep(delay)
 
             # Try the original URL
             try:
-                logger.debug(f"Attempting to scrape URL: {url}")
-                result = await asyncio.wait_for(
-                    client.async_scrape(ScrapeConfig(
-                        url=url,
-                        **scrape_params
-                    )),
-                    timeout=timeout
-                )
+                logger.debug("Attempting to scrape URL: %s", url)
+                result = await fetch(url)
             except asyncio.TimeoutError:
-                logger.warning(f"Scrape timed out after {timeout}s for {url}")
+                logger.warning("Scrape timed out after %ss for %s", timeout, url)
+                result = None
                 
                 # For HTTPS URLs that time out, try fallback to HTTP version
-                if url.startswith('https://') and attempt == 0:
-                    http_url = url.replace('https://', 'http://', 1)
-                    logger.debug(f"Trying HTTP fallback for timed out HTTPS URL: {http_url}")
+                if policy['http_fallback_on_timeout'] and url.startswith('https://') and attempt == 0:
+                    http_url = 'http' + url[5:]  # Drop the 's' of the known https:// prefix
+                    logger.debug("Trying HTTP fallback for timed out HTTPS URL: %s", http_url)
                     try:
-                        result = await asyncio.wait_for(
-                            client.async_scrape(ScrapeConfig(
-                                url=http_url,
-                                **scrape_params
-                            )),
-                            timeout=timeout
-                        )
-                        logger.info(f"HTTP fallback successful for {url}")
+                        result = await fetch(http_url)
+                        logger.info("HTTP fallback successful for %s", url)
                     except asyncio.TimeoutError:
-                        logger.warning(f"HTTP fallback also timed out for {http_url}")
-                        if attempt < max_retries - 1:
-                            continue
-                        logger.error(f"Both HTTPS and HTTP attempts timed out for {url}")
-                        return None
-                else:
-                    # Regular timeout handling for non-HTTPS URLs or after first attempt
-                    if attempt < max_retries - 1:
+                        logger.warning("HTTP fallback also timed out for %s", http_url)
+                        
+                if result is None:
+                    if policy['retry_timeout'] and not last_attempt:
                         continue
-                    logger.error(f"Scrape timed out after {timeout}s for {url} (max retries exceeded)")
+                    logger.error("Scrape timed out after %ss for %s (max retries exceeded)", timeout, url)
                     return None
                 
+            status_code = result.response.status_code
+            
             # Handle 301 redirects explicitly (for services like Namecheap URL forwarding)
-            if result.response.status_code == 301:
+            if status_code == 301 and policy['follow_301_manually']:
                 location = result.response.headers.get('location')
                 if location:
-                    logger.debug(f"Got 301 redirect from {url} to {location}, following manually")
+                    logger.debug("Got 301 redirect from %s to %s, following manually", url, location)
                     try:
-                        # Create a new scrape config for the redirect target
-                        redirect_result = await asyncio.wait_for(
-                            client.async_scrape(ScrapeConfig(
-                                url=location,
-                                **scrape_params
-                            )),
-                            timeout=timeout
-                        )
-                        return redirect_result
+                        return await fetch(location)
                     except asyncio.TimeoutError:
-                        logger.warning(f"Redirect scrape timed out after {timeout}s for {location}")
-                        if attempt < max_retries - 1:
+                        logger.warning("Redirect scrape timed out after %ss for %s", timeout, location)
+                        if policy['retry_timeout'] and not last_attempt:
                             continue
-                        logger.error(f"Redirect scrape timed out after {timeout}s for {location} (max retries exceeded)")
+                        logger.error("Redirect scrape timed out after %ss for %s (max retries exceeded)", timeout, location)
                         return None
 
             # Check if response indicates a server error (5xx)
-            if 500 <= result.response.status_code < 600:
-                if attempt < max_retries - 1:
-                    logger.warning(f"Server error {result.response.status_code} for {url}. Will retry.")
+            if 500 <= status_code < 600 and policy['retry_5xx']:
+                if not last_attempt:
+                    logger.warning("Server error %d for %s. Will retry.", status_code, url)
                     continue
-                logger.error(f"Server error {result.response.status_code} persisted after all retries for {url}")
-                return result
+                logger.error("Server error %d persisted after all retries for %s", status_code, url)
             
             # For rate limits, respect retry-after header
-            if result.response.status_code == 429:
-                if attempt < max_retries - 1:
+            elif status_code == 429 and policy['retry_429']:
+                if not last_attempt:
+                    # Wait for the server's retry-after instead of the backoff;
+                    # without a usable header the regular backoff applies
                     retry_after = result.response.headers.get('retry-after')
-                    delay = float(retry_after) if retry_after else base_delay * (2 ** attempt)
-                    logger.warning(f"Rate limited on {url}. Waiting {delay:.2f}s before retry.")
-                    await asyncio.sleep(delay)
+                    retry_after_delay = RateLimiter.parse_retry_after(retry_after) if retry_after else None
+                    logger.warning("Rate limited on %s. Will retry.", url)
                     continue
-                logger.error(f"Rate limiting persisted after all retries for {url}")
-                return result
+                logger.error("Rate limiting persisted after all retries for %s", url)
 
             # All other responses (including 4xx) are returned without retry
             return result
 
         except (asyncio.TimeoutError, ConnectionError) as e:
             # Only retry network-related errors
-            last_error = e
-            if attempt < max_retries - 1:
-                logger.warning(f"Network error on attempt {attempt + 1} for {url}: {str(e)}. Will retry.")
+            if not last_attempt:
+                logger.warning("Network error on attempt %d for %s: %s. Will retry.", attempt + 1, url, e)
                 continue
-            logger.error(f"Network error persisted after all retries for {url}: {str(e)}")
+            logger.error("Network error persisted after all retries for %s: %s", url, e)
             return None
         except Exception as e:
             # Don't retry other exceptions
-            logger.error(f"Non-retryable error for {url}: {str(e)}")
+            logger.error("Non-retryable error for %s: %s", url, e)
             return None
 
     # If we reach here, all retries failed
     return None
 
-async def scrape_url(client: ScrapflyClient, url: str, tracker: LinkTracker, rate_limiter: RateLimiter) -> Optional[Dict]:
-    """Scrape a single URL and return the result data"""
-    logger.debug(f"Starting to scrape URL: {url}")
+def parse_page(html: str, base_url: str, exclude_patterns: Optional[Sequence[str]] = None,
+               fingerprint: bool = False) -> Tuple[Set[str], Optional[int]]:
+    """Parse a page once and return its crawlable links and, if asked, the
+    SimHash of its visible text (runs in a worker process)
+    """
+    try:
+        doc = lxml.html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        all_links = Selector(text=html).css("a::attr(href)").getall()
+        return filter_links(base_url, all_links, exclude_patterns=exclude_patterns), None
+    # Query lxml directly, skipping parsel's CSS translation and Selector wrappers
+    all_links = doc.xpath('//a/@href', smart_strings=False)
+    page_fingerprint = None
+    if fingerprint:
+        # Fingerprint only the text a reader sees: markup and scripts shared by
+        # the site template would otherwise make every page look alike
+        etree.strip_elements(doc, 'script', 'style', with_tail=False)
+        page_fingerprint = simhash(doc.text_content())
+    return filter_links(base_url, all_links, exclude_patterns=exclude_patterns), page_fingerprint
+
+async def scrape_url(client: ScrapflyClient, url: str, tracker: LinkTracker, rate_limiter: RateLimiter,
+                     executor: Optional[Executor] = None) -> Optional[Dict]:
+    """Scrape a single URL and return the result data.
+    
+    If an executor is given, HTML parsing, link extraction and near-duplicate
+    fingerprinting run there instead of on the event loop.
+    """
+    logger.debug("Starting to scrape URL: %s", url)
     
     # Check if URL should be excluded based on patterns
-    if should_exclude_url(url, tracker.exclude_patterns):
-        logger.debug(f"Skipping excluded URL: {url}")
+    if tracker.is_excluded(url):
+        logger.debug("Skipping excluded URL: %s", url)
         tracker.update_status(url, CrawlStatus.FAILED, "URL matches exclude pattern")
         return None
     
     # Skip binary content URLs
-    if any(ext in url.lower() for ext in ['.jpg', '.jpeg', '.png', '.gif', '.mp4', '.mp3', '.pdf', '.zip']):
-        logger.debug(f"Skipping binary content URL: {url}")
+    if _is_binary_url(url):
+        logger.debug("Skipping binary content URL: %s", url)
         return None
         
     try:
-        await rate_limiter.wait_if_needed()
-        metadata = tracker.links.get(url, LinkMetadata(url=url))
+        metadata = tracker.get_or_create(url)
         
         # Set default scrape parameters with explicit redirect handling
         scrape_params = {
@@ -155,7 +218,7 @@ async def scrape_url(client: ScrapflyClient, url: str, tracker: LinkTracker, rat
                 'Connection': 'keep-alive',
                 'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
             },
-            **metadata.scrape_params  # Include any existing params
+            **metadata.effective_scrape_params()  # Include any existing params
         }
         
         # Remove allow_redirects as it's not a valid parameter
@@ -163,43 +226,35 @@ async def scrape_url(client: ScrapflyClient, url: str, tracker: LinkTracker, rat
             scrape_params.pop('allow_redirects')
         
         # Scrape with retry only for network/server errors
-        result = await scrape_with_retry(client, url, scrape_params)
+        result = await scrape_with_retry(client, url, scrape_params, rate_limiter=rate_limiter)
         
         # Check if result is None (could happen if all retries failed)
         if result is None:
-            logger.error(f"Failed to get a valid result for {url} after all retries")
+            logger.error("Failed to get a valid result for %s after all retries", url)
             tracker.update_status(url, CrawlStatus.FAILED, "Failed to get a valid result after all retries")
             return None
         
-        # Update rate limiter based on response
-        rate_limiter.update_concurrency(
-            result.response.status_code,
-            result.response.headers.get('retry-after')
-        )
-        
         # Check for client errors (4xx)
         if 400 <= result.response.status_code < 500:
-            logger.debug(f"Client error {result.response.status_code} for {url}")
+            logger.debug("Client error %d for %s", result.response.status_code, url)
             tracker.update_status(url, CrawlStatus.FAILED, f"Client error: {result.response.status_code}")
             return None
             
         # Check content type
-        content_type = result.response.headers.get('content-type', '').lower()
-        is_binary = any(binary_type in content_type for binary_type in ['image/', 'video/', 'audio/', 'application/octet-stream'])
-        
-        if is_binary:
-            logger.debug(f"Skipping binary content response: {url}")
+        content_type = result.response.headers.get('content-type')
+        if content_type and _BINARY_CONTENT_TYPE_RE.search(content_type):
+            logger.debug("Skipping binary content response: %s", url)
             return None
             
         # Update tracker with result
-        tracker.update_from_result(result, url, metadata.scrape_params)
+        tracker.update_from_result(result, url, metadata.scrape_params_override, content_type=content_type)
         
-        # Track redirect chain if present
-        redirect_chain = []
-        if result.response.history:
-            redirect_chain = [r.url for r in result.response.history]
-            logger.debug(f"Followed redirect chain: {' -> '.join(redirect_chain)}")
+        # The tracker recorded the redirect chain, if any
+        redirect_chain = metadata.redirect_chain or ()
+        if redirect_chain:
+            logger.debug("Followed redirect chain: %s", ' -> '.join(redirect_chain))
 
+        crawled_at = metadata.crawled_at_dt
         data = {
             "url": url,
             "final_url": result.response.url,  # The URL after following redirects
@@ -207,11 +262,11 @@ async def scrape_url(client: ScrapflyClient, url: str, tracker: LinkTracker, rat
             "metadata": {
                 "status_code": metadata.status_code,
                 "content_type": metadata.content_type,
-                "crawled_at": metadata.crawled_at.isoformat() if metadata.crawled_at else None,
+                "crawled_at": crawled_at.isoformat() if crawled_at else None,
                 "proxy_country": metadata.proxy_country,
                 "render_js": metadata.render_js,
                 "timing": metadata.timing,
-                "scrape_params": metadata.scrape_params,
+                "scrape_params": metadata.effective_scrape_params(),
                 "redirect_chain": redirect_chain,
                 "is_redirected": bool(redirect_chain)
             }
@@ -219,21 +274,35 @@ async def scrape_url(client: ScrapflyClient, url: str, tracker: LinkTracker, rat
 
         # Extract and process links
         try:
-            all_links = result.selector.css("a::attr(href)").getall()
-            logger.debug(f"Found {len(all_links)} raw links on page {url}")
+            parse_args = (result.content or '', tracker.base_url, tracker.exclude_patterns,
+                          tracker.near_duplicate_distance is not None)
+            if executor is not None:
+                filtered_links, fingerprint = await asyncio.get_event_loop().run_in_executor(
+                    executor, parse_page, *parse_args
+                )
+            else:
+                filtered_links, fingerprint = parse_page(*parse_args)
+
+            # Skip link following for pages that mirror an already crawled page
+            if fingerprint is not None:
+                duplicate_of = tracker.find_near_duplicate(url, fingerprint)
+                if duplicate_of:
+                    logger.debug("Page %s is a near-duplicate of %s, not following its links", url, duplicate_of)
+                    data["metadata"]["duplicate_of"] = duplicate_of
+                    return data
             
-            # Filter and add new links to tracker
-            filtered_links = filter_links(tracker.base_url, all_links, exclude_patterns=tracker.exclude_patterns)
-            for link in filtered_links:
-                if tracker.add_link(link):
-                    logger.debug(f"Added new link to track: {link}")
+            # Add new links to tracker, skipping the many already seen on other pages
+            new_links = [link for link in filtered_links if link not in tracker.seen]
+            if new_links:
+                added = tracker.add_links_bulk(new_links)
+                logger.debug("Added %d new links to track from %s", len(added), url)
         except Exception as e:
-            logger.warning(f"Failed to extract links from {url}: {str(e)}")
+            logger.warning("Failed to extract links from %s: %s", url, e)
                 
-        logger.debug(f"Prepared data for storage: {data['url']}, status: {data['metadata']['status_code']}")
+        logger.debug("Prepared data for storage: %s, status: %s", data['url'], data['metadata']['status_code'])
         return data
         
     except Exception as e:
-        logger.error(f"Failed to scrape {url}: {str(e)}")
+        logger.error("Failed to scrape %s: %s", url, e)
         tracker.update_status(url, CrawlStatus.FAILED, str(e))
         return None
@@ -1,24 +1,65 @@
+from collections import deque
 from datetime import datetime
-import json
 import logging
+import time
 from pathlib import Path
-from typing import Dict, Set, Optional, List
-from .models import LinkMetadata, CrawlStatus
-from .utils import get_domain, strip_url_fragment, normalize_query_params, should_exclude_url
+from typing import Any, Dict, Iterable, KeysView, Set, Optional, List, Tuple
+import orjson
+from .models import LinkMetadata, CrawlStatus, default_scrape_params
+from .utils import get_domain, canonicalize_url, compile_exclude_patterns, hamming_distance, urlparse
 
 logger = logging.getLogger(__name__)
 
+# Number of logged updates after which the full state snapshot is rewritten
+SNAPSHOT_INTERVAL = 500
+
+# Buffered URL updates are flushed to the log once this many URLs are dirty
+# or this many seconds have passed since the last flush
+FLUSH_INTERVAL = 100
+FLUSH_SECONDS = 30
+
+def _iso_to_ns(value: str) -> int:
+    """Parse a local ISO 8601 time into a time.time_ns() timestamp"""
+    return int(datetime.fromisoformat(value).timestamp() * 1e9)
+
 class LinkTracker:
-    def __init__(self, base_url: str, state_file: Optional[Path] = None, exclude_patterns: Optional[List[str]] = None):
+    def __init__(self, base_url: str, state_file: Optional[Path] = None, exclude_patterns: Optional[List[str]] = None,
+                 near_duplicate_distance: Optional[int] = None):
         self.base_url = base_url
-        self.domain = get_domain(base_url)
+        # Compared with hosts of canonical URLs, so without a default port
+        self.domain = get_domain(canonicalize_url(base_url))
+        # One entry per URL holding its metadata, status and discovery time
         self.links: Dict[str, LinkMetadata] = {}
-        self.status: Dict[str, CrawlStatus] = {}
-        self.discovered_at: Dict[str, datetime] = {}
+        # URLs grouped by status, kept in sync with the metadata by _set_status
+        self._by_status: Dict[CrawlStatus, Set[str]] = {status: set() for status in CrawlStatus}
+        # Crawl frontier in discovery order; entries whose status moved on
+        # are dropped lazily when popped
+        self._pending: deque = deque()
         self.state_file = state_file
-        self.exclude_patterns = exclude_patterns or []
+        # Updates are appended to a log next to the snapshot and folded into
+        # the snapshot every SNAPSHOT_INTERVAL entries
+        self._log_entries = 0
+        # URLs changed since the last flush, in update order, with the log
+        # operation needed to record the change ('add', 'status' or 'meta')
+        self._dirty: Dict[str, str] = {}
+        self._last_flush = time.monotonic()
+        # Distinct scrape parameter overrides, so links with equal overrides
+        # share one dict instead of each holding a copy
+        self._params_intern: Dict[bytes, Dict] = {}
+        # Never changed in place, so kept immutable; a tuple also passes
+        # straight through the lru_cache keys that compile the patterns
+        self.exclude_patterns: Tuple[str, ...] = tuple(exclude_patterns or ())
+        self._exclude_re = compile_exclude_patterns(self.exclude_patterns)
         self.excluded_count = 0
         
+        # Near-duplicate page detection (disabled when None). Fingerprints are
+        # split into distance + 1 bands: by pigeonhole, any fingerprint within
+        # the distance matches at least one band exactly
+        self.near_duplicate_distance = near_duplicate_distance
+        self._fingerprint_bands: List[Dict[int, List[Tuple[int, str]]]] = []
+        if near_duplicate_distance is not None:
+            self._fingerprint_bands = [{} for _ in range(min(near_duplicate_distance + 1, 64))]
+        
         # Log exclude patterns if any
         if self.exclude_patterns:
             logger.info(f"Using exclude patterns: {', '.join(self.exclude_patterns)}")
@@ -29,6 +70,17 @@ class LinkTracker:
             
             # Filter out any existing links that match exclude patterns
             self._filter_excluded_links()
+        elif state_file:
+            # Start with an empty snapshot so the update log can always be resumed
+            self.save_state()
+            
+    def is_excluded(self, url: str) -> bool:
+        """Check if URL path matches any of the exclude patterns"""
+        # The path is a substring of the URL, so a miss on the raw string
+        # settles the common case without parsing the URL
+        if self._exclude_re is None or self._exclude_re.search(url) is None:
+            return False
+        return self._exclude_re.search(urlparse(url).path) is not None
             
     def _filter_excluded_links(self) -> None:
         """Remove any links from the tracker that match exclude patterns"""
@@ -37,7 +89,7 @@ class LinkTracker:
             
         links_to_remove = []
         for url in self.links:
-            if should_exclude_url(url, self.exclude_patterns):
+            if self.is_excluded(url):
                 links_to_remove.append(url)
                 
         if links_to_remove:
@@ -45,12 +97,7 @@ class LinkTracker:
             
         for url in links_to_remove:
             logger.debug(f"Removing excluded URL from tracker: {url}")
-            if url in self.links:
-                del self.links[url]
-            if url in self.status:
-                del self.status[url]
-            if url in self.discovered_at:
-                del self.discovered_at[url]
+            self._by_status[self.links.pop(url).status].discard(url)
                 
             # Increment the excluded count
             self.excluded_count += 1
@@ -59,182 +106,374 @@ class LinkTracker:
         if self.state_file and links_to_remove:
             self.save_state()
             
+    @property
+    def seen(self) -> KeysView:
+        """Canonical URLs already tracked, in any status (a live view)"""
+        return self.links.keys()
+        
     def add_link(self, url: str) -> bool:
         """Add a new link to track. Returns True if link was added, False if it already exists."""
-        # Normalize query parameters and strip fragment
-        clean_url = normalize_query_params(url)
-        clean_url = strip_url_fragment(clean_url)
+        return bool(self.add_links_bulk([url]))
         
-        # Check if URL should be excluded based on patterns
-        if should_exclude_url(clean_url, self.exclude_patterns):
-            self.excluded_count += 1
-            return False
+    def add_links_bulk(self, urls: Iterable[str]) -> List[str]:
+        """Add several links to track, skipping known and excluded ones. Returns the links added."""
+        new_urls: Dict[str, None] = {}
+        for url in urls:
+            # Canonicalize so equivalent URLs map to the same entry
+            clean_url = canonicalize_url(url)
             
-        if clean_url in self.links:
-            return False
+            # Most links on a page are already known (navigation, footers),
+            # so answer that with a hash lookup before matching patterns
+            if clean_url in self.links or clean_url in new_urls:
+                continue
             
-        self.links[clean_url] = LinkMetadata(url=clean_url)
-        self.status[clean_url] = CrawlStatus.PENDING
-        self.discovered_at[clean_url] = datetime.now()
-        
-        # Save state after adding new link
-        if self.state_file:
-            self.save_state()
+            # Check if URL should be excluded based on patterns
+            if self.is_excluded(clean_url):
+                self.excluded_count += 1
+            else:
+                new_urls[clean_url] = None
+                
+        if not new_urls:
+            return []
             
-        return True
+        # Links found together (e.g. on one page) share a discovery time
+        discovered_at = time.time_ns()
+        self.links.update({url: LinkMetadata(url=url, discovered_at=discovered_at) for url in new_urls})
+        self._by_status[CrawlStatus.PENDING].update(new_urls)
+        self._pending.extend(new_urls)
         
-    def update_from_result(self, result, url: str, scrape_params: Optional[Dict] = None) -> None:
-        """Update link metadata from a scrape result"""
-        clean_url = normalize_query_params(url)
-        clean_url = strip_url_fragment(clean_url)
-        if clean_url not in self.links:
-            self.add_link(clean_url)
-            
-        metadata = self.links[clean_url]
+        # Record the new links in the state log
+        self.save_state_delta(*new_urls, op='add')
+        return list(new_urls)
+        
+    def get_or_create(self, url: str) -> LinkMetadata:
+        """Return the metadata for a URL, creating it only if the URL is not tracked yet"""
+        url = canonicalize_url(url)
+        metadata = self.links.get(url)
+        if metadata is None:
+            metadata = self.links[url] = LinkMetadata(url=url, discovered_at=time.time_ns())
+            self._by_status[metadata.status].add(url)
+            self.save_state_delta(url, op='add')
+        return metadata
+        
+    def update_from_result(self, result, url: str, scrape_params: Optional[Dict] = None,
+                           content_type: Optional[str] = None) -> None:
+        """Update link metadata from a scrape result.
+        
+        content_type can be passed when the caller already read the header.
+        """
+        clean_url = canonicalize_url(url)
+        metadata = self.get_or_create(clean_url)
         metadata.status_code = result.response.status_code
-        metadata.content_type = result.response.headers.get("content-type")
-        metadata.crawled_at = datetime.now()
+        metadata.content_type = content_type if content_type is not None else result.response.headers.get("content-type")
+        metadata.crawled_at = time.time_ns()
         
         # Track redirect information
         if result.response.history:
             metadata.is_redirected = True
-            metadata.redirect_chain = [r.url for r in result.response.history]
+            metadata.redirect_chain = tuple(r.url for r in result.response.history)
             metadata.final_url = result.response.url
         else:
             metadata.is_redirected = False
-            metadata.redirect_chain = []
+            metadata.redirect_chain = ()
             metadata.final_url = clean_url
         
-        # Initialize scrape_params to empty dict if None
-        safe_scrape_params = scrape_params or {}
-        metadata.scrape_params = safe_scrape_params
-        metadata.render_js = safe_scrape_params.get("render_js", False)
+        # Only keep parameters that differ from the shared defaults
+        metadata.scrape_params_override = self._intern_params(scrape_params)
+        metadata.render_js = metadata.effective_scrape_params().get("render_js", False)
             
-        self.links[clean_url] = metadata
-        self.status[clean_url] = CrawlStatus.COMPLETED
+        self._set_status(clean_url, CrawlStatus.COMPLETED)
         
-        # Save state after updating link
-        if self.state_file:
-            self.save_state()
+        # Record the result in the state log
+        self.save_state_delta(clean_url)
         
         # If URL was redirected, add the final URL to tracking if it's on the same domain
         if metadata.is_redirected and metadata.final_url and get_domain(metadata.final_url) == self.domain:
-            final_clean_url = normalize_query_params(metadata.final_url)
-            final_clean_url = strip_url_fragment(final_clean_url)
+            final_clean_url = canonicalize_url(metadata.final_url)
             if final_clean_url not in self.links:
                 self.add_link(final_clean_url)
 
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        """Split a 64-bit fingerprint into one key per band"""
+        bands = len(self._fingerprint_bands)
+        bounds = [64 * i // bands for i in range(bands + 1)]
+        return [fingerprint >> start & ((1 << (end - start)) - 1)
+                for start, end in zip(bounds, bounds[1:])]
+
+    def find_near_duplicate(self, url: str, fingerprint: int) -> Optional[str]:
+        """Return a crawled URL whose page fingerprint is within near_duplicate_distance.
+        
+        If there is none, the fingerprint is recorded for later pages.
+        """
+        if self.near_duplicate_distance is None:
+            return None
+            
+        keys = self._band_keys(fingerprint)
+        for index, key in zip(self._fingerprint_bands, keys):
+            for other_fingerprint, other_url in index.get(key, ()):
+                if other_url != url and hamming_distance(fingerprint, other_fingerprint) <= self.near_duplicate_distance:
+                    return other_url
+                    
+        for index, key in zip(self._fingerprint_bands, keys):
+            index.setdefault(key, []).append((fingerprint, url))
+        return None
+
+    def _set_status(self, url: str, status: CrawlStatus) -> None:
+        """Set the status of a tracked URL and move it to the matching status index"""
+        metadata = self.links[url]
+        self._by_status[metadata.status].discard(url)
+        metadata.status = status
+        self._by_status[status].add(url)
+
+    def get_status(self, url: str) -> Optional[CrawlStatus]:
+        """Get the status of a URL, or None if it isn't tracked"""
+        metadata = self.links.get(canonicalize_url(url))
+        return metadata.status if metadata else None
+
     def get_all_links(self) -> Set[str]:
         """Get all tracked links regardless of status"""
         return set(self.links.keys())
         
     def update_status(self, url: str, status: CrawlStatus, error: Optional[str] = None) -> None:
         """Update the status of a link"""
-        clean_url = normalize_query_params(url)
-        clean_url = strip_url_fragment(clean_url)
+        clean_url = canonicalize_url(url)
         if clean_url in self.links:
-            self.status[clean_url] = status
+            self._set_status(clean_url, status)
             if error:
                 self.links[clean_url].error = error
             
-            # Save state after status update
-            if self.state_file:
-                self.save_state()
+            # Record the status change in the state log
+            self.save_state_delta(clean_url, op='status')
                 
     def get_pending_links(self) -> Set[str]:
         """Get all links that haven't been crawled yet, excluding any that match exclude patterns"""
-        pending_links = {url for url, status in self.status.items() 
-                        if status == CrawlStatus.PENDING}
-        
-        # Filter out any URLs that match exclude patterns
-        if self.exclude_patterns:
-            pending_links = {url for url in pending_links 
-                           if not should_exclude_url(url, self.exclude_patterns)}
-            
-        return pending_links
+        # Exclusion is decided once: excluded links are never added, and
+        # links loaded from a state file are filtered on startup
+        return set(self._by_status[CrawlStatus.PENDING])
+                
+    def pop_pending(self, n: Optional[int] = None) -> List[str]:
+        """Pop up to n pending links (all if n is None) in discovery order"""
+        popped: List[str] = []
+        while self._pending and (n is None or len(popped) < n):
+            url = self._pending.popleft()
+            if url in self._by_status[CrawlStatus.PENDING]:
+                popped.append(url)
+        return popped
                 
     def get_failed_links(self) -> Set[str]:
         """Get all links that failed to crawl"""
-        return {url for url, status in self.status.items()
-                if status == CrawlStatus.FAILED}
+        return set(self._by_status[CrawlStatus.FAILED])
                 
     def get_completed_links(self) -> Set[str]:
         """Get all successfully crawled links"""
-        return {url for url, status in self.status.items()
-                if status == CrawlStatus.COMPLETED}
+        return set(self._by_status[CrawlStatus.COMPLETED])
+
+    def count_links(self, status: CrawlStatus) -> int:
+        """Get the number of links with the given status without copying them"""
+        return len(self._by_status[status])
 
     def get_excluded_count(self) -> int:
         """Get the total number of URLs that were excluded"""
         return self.excluded_count
 
+    @property
+    def log_file(self) -> Optional[Path]:
+        """Append-only log of updates made since the last snapshot"""
+        return self.state_file.with_suffix('.log') if self.state_file else None
+
     def save_state(self) -> None:
-        """Save current state to file"""
+        """Save a full snapshot of the current state and reset the update log"""
         if not self.state_file:
             return
             
+        # orjson serializes LinkMetadata and CrawlStatus values natively
         state = {
             'base_url': self.base_url,
             'domain': self.domain,
             'exclude_patterns': self.exclude_patterns,
             'excluded_count': self.excluded_count,
-            'links': {
-                url: {
-                    'url': metadata.url,
-                    'status_code': metadata.status_code,
-                    'content_type': metadata.content_type,
-                    'crawled_at': metadata.crawled_at.isoformat() if metadata.crawled_at else None,
-                    'error': metadata.error,
-                    'proxy_country': metadata.proxy_country,
-                    'render_js': metadata.render_js,
-                    'timing': metadata.timing,
-                    'scrape_params': metadata.scrape_params,
-                    'final_url': metadata.final_url,
-                    'redirect_chain': metadata.redirect_chain,
-                    'is_redirected': metadata.is_redirected
-                }
-                for url, metadata in self.links.items()
-            },
-            'status': {url: status.value for url, status in self.status.items()},
-            'discovered_at': {url: dt.isoformat() for url, dt in self.discovered_at.items()}
+            'links': self.links
         }
         
-        self.state_file.write_text(json.dumps(state))
+        self.state_file.write_bytes(orjson.dumps(state))
+        
+        # Everything in the log and the buffer is now part of the snapshot
+        log_file = self.log_file
+        if log_file is not None and log_file.exists():
+            log_file.write_bytes(b'')
+        self._log_entries = 0
+        self._dirty.clear()
+        self._last_flush = time.monotonic()
+
+    def compact(self) -> None:
+        """Fold the update log into a fresh snapshot"""
+        self.save_state()
+
+    def save_state_delta(self, *urls: str, op: str = 'meta') -> None:
+        """Mark URLs as changed, flushing buffered updates when due.
+        
+        op names the smallest log operation that records the change: 'add'
+        for a new pending link, 'status' for a status change and 'meta' for
+        the full metadata. A URL changed in different ways before a flush
+        is logged with its full metadata.
+        """
+        if not self.state_file:
+            return
+            
+        for url in urls:
+            self._dirty[url] = op if self._dirty.get(url, op) == op else 'meta'
+        if len(self._dirty) >= FLUSH_INTERVAL or time.monotonic() - self._last_flush > FLUSH_SECONDS:
+            self.flush_state()
+
+    def flush_state(self) -> None:
+        """Append the current state of every changed URL to the update log"""
+        log_file = self.log_file
+        if log_file is None or not self._dirty:
+            return
+            
+        lines = []
+        for url, op in self._dirty.items():
+            metadata = self.links.get(url)
+            if metadata is None:
+                continue
+            entry: Dict[str, Any]
+            if op == 'add':
+                entry = {'op': 'add', 'url': url, 'discovered_at': metadata.discovered_at}
+            elif op == 'status':
+                entry = {'op': 'status', 'url': url, 'status': metadata.status, 'error': metadata.error}
+            else:
+                entry = {'op': 'meta', 'url': url, 'metadata': metadata}
+            lines.append(orjson.dumps(entry) + b'\n')
+        # Exclusions are only counted, so the current total goes on a line of its own
+        lines.append(orjson.dumps({'op': 'excluded', 'count': self.excluded_count}) + b'\n')
+        with open(log_file, 'ab') as f:
+            f.write(b''.join(lines))
+        
+        self._log_entries += len(lines)
+        self._dirty.clear()
+        self._last_flush = time.monotonic()
+        if self._log_entries >= SNAPSHOT_INTERVAL:
+            self.compact()
+
+    def _intern_params(self, params: Optional[Dict]) -> Optional[Dict]:
+        """Return the shared dict equal to params, registering params if it is new"""
+        if not params:
+            return None
+        return self._params_intern.setdefault(orjson.dumps(params, option=orjson.OPT_SORT_KEYS), params)
+        
+    def _metadata_from_dict(self, link_data: Dict[str, Any], url: Optional[str] = None) -> LinkMetadata:
+        """Rebuild LinkMetadata from its serialized form.
+        
+        Pass the URL used as the links key so that key and metadata share
+        one string instead of holding two equal copies.
+        """
+        metadata = LinkMetadata(url=url or link_data['url'])
+        metadata.status_code = link_data['status_code']
+        metadata.content_type = link_data['content_type']
+        # States saved before timestamps became time_ns() hold ISO strings
+        crawled_at = link_data['crawled_at']
+        metadata.crawled_at = _iso_to_ns(crawled_at) if isinstance(crawled_at, str) else crawled_at
+        metadata.error = link_data['error']
+        metadata.proxy_country = link_data['proxy_country']
+        metadata.render_js = link_data['render_js']
+        metadata.timing = link_data['timing']
+        # States saved before overrides were split out hold the full parameters
+        override = link_data.get('scrape_params_override', link_data.get('scrape_params'))
+        metadata.scrape_params_override = self._intern_params(override) if override != default_scrape_params() else None
+        metadata.final_url = link_data['final_url']
+        metadata.redirect_chain = tuple(link_data['redirect_chain']) if link_data['redirect_chain'] is not None else None
+        metadata.is_redirected = link_data['is_redirected']
+        # States saved before status and discovery time moved into the
+        # metadata keep them in separate maps; load_state fills those in
+        if 'status' in link_data:
+            metadata.status = CrawlStatus(link_data['status'])
+        metadata.discovered_at = link_data.get('discovered_at')
+        return metadata
+
+    def _replay_log(self, log_file: Path) -> None:
+        """Apply updates logged after the last snapshot"""
+        for line in log_file.read_bytes().splitlines():
+            try:
+                entry = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # A crash can leave a partially written last line
+                logger.warning(f"Ignoring unreadable entry in state log: {log_file}")
+                continue
+            op = entry.get('op')
+            if op == 'add':
+                if entry['url'] not in self.links:
+                    self.links[entry['url']] = LinkMetadata(url=entry['url'], discovered_at=entry['discovered_at'])
+            elif op == 'status':
+                metadata = self.links.get(entry['url'])
+                if metadata is not None:
+                    metadata.status = CrawlStatus(entry['status'])
+                    metadata.error = entry['error']
+            elif op == 'meta':
+                self.links[entry['url']] = self._metadata_from_dict(entry['metadata'], entry['url'])
+            elif op == 'excluded':
+                self.excluded_count = entry['count']
+            elif op is None:
+                # Logs written before typed operations hold the full metadata,
+                # older ones with status and discovery time alongside it
+                if entry['metadata'] is not None:
+                    metadata = self._metadata_from_dict(entry['metadata'], entry['url'])
+                    if entry.get('status') is not None:
+                        metadata.status = CrawlStatus(entry['status'])
+                    if entry.get('discovered_at') is not None:
+                        metadata.discovered_at = _iso_to_ns(entry['discovered_at'])
+                    self.links[entry['url']] = metadata
+                self.excluded_count = entry['excluded_count']
+            self._log_entries += 1
 
     def load_state(self, state_file: Path) -> None:
         """Load state from file"""
-        state = json.loads(state_file.read_text())
+        state = orjson.loads(state_file.read_bytes())
         
         self.base_url = state['base_url']
-        self.domain = state['domain']
+        # State files written before default ports were stripped may carry one
+        self.domain = get_domain(canonicalize_url(self.base_url))
         
         # Load exclude patterns if they exist in the state file
         if 'exclude_patterns' in state:
             # If current exclude patterns are provided, they take precedence
             if not self.exclude_patterns:
-                self.exclude_patterns = state['exclude_patterns']
+                self.exclude_patterns = tuple(state['exclude_patterns'])
+                self._exclude_re = compile_exclude_patterns(self.exclude_patterns)
                 
         # Load excluded count if it exists
         self.excluded_count = state.get('excluded_count', 0)
         
         # Restore links
-        self.links = {}
-        for url, link_data in state['links'].items():
-            metadata = LinkMetadata(url=link_data['url'])
-            metadata.status_code = link_data['status_code']
-            metadata.content_type = link_data['content_type']
-            metadata.crawled_at = datetime.fromisoformat(link_data['crawled_at']) if link_data['crawled_at'] else None
-            metadata.error = link_data['error']
-            metadata.proxy_country = link_data['proxy_country']
-            metadata.render_js = link_data['render_js']
-            metadata.timing = link_data['timing']
-            metadata.scrape_params = link_data['scrape_params'] or {}
-            metadata.final_url = link_data['final_url']
-            metadata.redirect_chain = link_data['redirect_chain']
-            metadata.is_redirected = link_data['is_redirected']
-            self.links[url] = metadata
-            
-        # Restore status
-        self.status = {url: CrawlStatus(status) for url, status in state['status'].items()}
-        
-        # Restore discovered_at
-        self.discovered_at = {url: datetime.fromisoformat(dt) for url, dt in state['discovered_at'].items()}
\ No newline at end of file
+        self.links = {url: self._metadata_from_dict(link_data, url)
+                      for url, link_data in state['links'].items()}
+            
+        # Older states keep status and discovery times in separate maps
+        for url, status in state.get('status', {}).items():
+            if url in self.links:
+                self.links[url].status = CrawlStatus(status)
+        for url, dt in state.get('discovered_at', {}).items():
+            if url in self.links:
+                self.links[url].discovered_at = _iso_to_ns(dt)
+        
+        # Apply updates made after the snapshot was written
+        log_file = state_file.with_suffix('.log')
+        if log_file.exists():
+            self._replay_log(log_file)
+        
+        # Links saved under an older canonical form move to the current one;
+        # when two collapse into one entry, a crawled one wins
+        for url in [url for url in self.links if canonicalize_url(url) != url]:
+            metadata = self.links.pop(url)
+            clean_url = canonicalize_url(url)
+            existing = self.links.get(clean_url)
+            if existing is None or (existing.status != CrawlStatus.COMPLETED
+                                    and metadata.status == CrawlStatus.COMPLETED):
+                metadata.url = clean_url
+                self.links[clean_url] = metadata
+        
+        # Rebuild the status index and the frontier from pending links
+        self._by_status = {status: set() for status in CrawlStatus}
+        for url, metadata in self.links.items():
+            self._by_status[metadata.status].add(url)
+        self._pending = deque(url for url, metadata in self.links.items()
+                              if metadata.status == CrawlStatus.PENDING)
\ No newline at end of file
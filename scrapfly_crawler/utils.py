@@ -1,90 +1,102 @@
-from urllib.parse import urlparse, urljoin, urldefrag, parse_qs, urlencode, urlunparse
-from typing import Set, List, Optional
+import re
+from collections import Counter
+from functools import lru_cache
+from hashlib import blake2b
+from urllib.parse import urlparse, urlsplit, urljoin, parse_qsl, urlencode, urlunparse, urlunsplit
+from typing import Callable, Iterable, Set, Optional, Pattern, Sequence, Tuple
 
+# File extensions and URL fragments of resources that are never crawled
+_SKIP_EXTENSIONS = (
+    # Images
+    '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico', '.bmp',
+    # Web resources
+    '.js', '.css', '.map',
+    # Fonts
+    '.woff', '.woff2', '.ttf', '.eot', '.otf',
+    # Documents
+    '.pdf', '.doc', '.docx',
+    # Data
+    '.json', '.xml',
+    # Media
+    '.mp4', '.webm', '.mp3', '.wav',
+    # Archives
+    '.zip', '.tar', '.gz'
+)
+_SKIP_PATTERNS = (
+    '/assets/', '/_assets/', '/static/', '/media/',
+    '/dist/', '/build/', '/vendor/',
+    'fonts.googleapis.com',
+    'ajax.googleapis.com'
+)
+
+@lru_cache(maxsize=65536)
 def is_resource_url(url: str) -> bool:
     """Check if URL is a resource that should be skipped"""
     url = url.lower()
-    # Add more extensions to skip
-    skip_extensions = {
-        # Images
-        '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico', '.bmp',
-        # Web resources
-        '.js', '.css', '.map',
-        # Fonts
-        '.woff', '.woff2', '.ttf', '.eot', '.otf',
-        # Documents
-        '.pdf', '.doc', '.docx',
-        # Data
-        '.json', '.xml',
-        # Media
-        '.mp4', '.webm', '.mp3', '.wav',
-        # Archives
-        '.zip', '.tar', '.gz'
-    }
-    # Check file extensions
-    if any(url.endswith(ext) for ext in skip_extensions):
+    # Check file extensions, ignoring any query string (e.g. style.css?v=3)
+    if url.partition('?')[0].endswith(_SKIP_EXTENSIONS):
         return True
     # Check URL patterns
-    skip_patterns = [
-        '/assets/', '/_assets/', '/static/', '/media/',
-        '/dist/', '/build/', '/vendor/',
-        'fonts.googleapis.com',
-        'ajax.googleapis.com'
-    ]
-    return any(pattern in url for pattern in skip_patterns)
-
-def should_exclude_url(url: str, exclude_patterns: Optional[List[str]] = None) -> bool:
-    """Check if URL should be excluded based on custom exclude patterns"""
+    return any(pattern in url for pattern in _SKIP_PATTERNS)
+
+def compile_exclude_patterns(exclude_patterns: Optional[Sequence[str]] = None) -> Optional[Pattern]:
+    """Combine exclude patterns into a single regex matching any of them literally"""
     if not exclude_patterns:
-        return False
-        
-    parsed = urlparse(url)
-    
-    # Check if any exclude pattern exists in the URL path
-    for pattern in exclude_patterns:
-        if pattern in parsed.path:
-            return True
-            
-    return False
-    
-def normalize_query_params(url: str) -> str:
-    """Normalize URL by removing or standardizing certain query parameters"""
-    # Parameters that should be removed as they don't affect content
-    skip_params = {
-        # Analytics
-        'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
-        # Cache busters
-        'timestamp', 'ts', 't', 'rand', 'random',
-        # Common tracking params
-        'fbclid', 'gclid', 'msclkid',
-        # Session/click IDs that don't affect content
-        '_hsenc', '_hsmi', 'mc_cid', 'mc_eid',
-    }
-    
-    parsed = urlparse(url)
-    if not parsed.query:
-        return url
-        
-    # Parse query parameters
-    params = parse_qs(parsed.query, keep_blank_values=True)
+        return None
+    return _compile_exclude_tuple(tuple(exclude_patterns))
+
+@lru_cache(maxsize=32)
+def _compile_exclude_tuple(exclude_patterns: Tuple[str, ...]) -> Pattern:
+    return re.compile('|'.join(re.escape(pattern) for pattern in exclude_patterns))
     
-    # Remove skipped parameters
-    filtered_params = {k: v for k, v in params.items() if k.lower() not in skip_params}
+# Query parameters that should be removed as they don't affect content
+_SKIP_PARAMS = frozenset({
+    # Analytics
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
+    # Cache busters
+    'timestamp', 'ts', 't', 'rand', 'random',
+    # Common tracking params
+    'fbclid', 'gclid', 'msclkid',
+    # Session/click IDs that don't affect content
+    '_hsenc', '_hsmi', 'mc_cid', 'mc_eid',
+})
+
+
+# Percent-escapes, and the unreserved characters (RFC 3986) that never
+# need one
+_PERCENT_ESCAPE_RE = re.compile(r'%[0-9A-Fa-f]{2}')
+_UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+
+def _normalize_escape(match) -> str:
+    char = chr(int(match.group()[1:], 16))
+    return char if char in _UNRESERVED else match.group().upper()
+
+@lru_cache(maxsize=131072)
+def canonicalize_url(url: str) -> str:
+    """Reduce URL to the canonical form used to deduplicate links.
     
-    # Reconstruct URL with filtered parameters
-    new_query = urlencode(filtered_params, doseq=True) if filtered_params else ''
-    return urlunparse((
-        parsed.scheme,
-        parsed.netloc,
-        parsed.path,
-        parsed.params,
-        new_query,
-        ''  # Remove fragment as it's handled separately
-    ))
-
-def strip_url_fragment(url: str) -> str:
-    """Remove fragment/anchor from URL"""
-    return urldefrag(url)[0]
+    Drops tracking parameters and the fragment, lowercases scheme and host,
+    removes default ports, uses / for an empty path, normalizes
+    percent-escapes in the path and sorts the remaining query parameters.
+    Only equivalences defined by RFC 3986 are applied, so www/non-www,
+    http/https and trailing-slash variants stay distinct.
+    """
+    # Parse once, filtering and sorting the query in the same pass
+    parsed = urlsplit(url)
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    path = parsed.path
+    if '%' in path:
+        path = _PERCENT_ESCAPE_RE.sub(_normalize_escape, path)
+    elif not path and netloc:
+        path = '/'
+    query = ''
+    if parsed.query:
+        params = parse_qsl(parsed.query, keep_blank_values=True)
+        query = urlencode(sorted(param for param in params if param[0].lower() not in _SKIP_PARAMS))
+    return urlunsplit((scheme, netloc, path, query, ''))
 
 
 def normalize_url(base_url: str, link: str) -> str:
@@ -94,37 +106,101 @@ def normalize_domain(domain: str) -> str:
     """Extract base domain without normalization"""
     return domain.lower()  # Just lowercase for consistency
 
+@lru_cache(maxsize=65536)
 def get_domain(url: str) -> str:
     """Extract and normalize domain from URL"""
     domain = urlparse(url).netloc
     return normalize_domain(domain)
 
 
-def filter_links(base_url: str, links: Set[str], exclude_patterns: Optional[List[str]] = None) -> Set[str]:
+_WEB_SCHEMES = ('http://', 'https://')
+_NON_WEB_SCHEMES = ('mailto:', 'tel:', 'javascript:', 'data:')
+
+def filter_links(base_url: str, links: Iterable[str], exclude_patterns: Optional[Sequence[str]] = None) -> Set[str]:
     """Filter and normalize a set of links"""
-    domain = get_domain(base_url)
-    normalized_links = set()
+    return make_link_filter(base_url, exclude_patterns)(links)
+
+def make_link_filter(base_url: str, exclude_patterns: Optional[Sequence[str]] = None) -> Callable[[Iterable[str]], Set[str]]:
+    """Return a filter_links function specialized for one base URL and set of exclude patterns.
     
-    for link in links:
-        if not link:  # Skip empty links
-            continue
-            
-        # Convert relative to absolute URL
-        absolute_url = normalize_url(base_url, link)
-        # Normalize query parameters and strip fragment
-        clean_url = normalize_query_params(absolute_url)
-        clean_url = strip_url_fragment(clean_url)
-        parsed_link = urlparse(clean_url)
-        
-        # Skip URLs matching exclude patterns
-        if should_exclude_url(clean_url, exclude_patterns):
-            continue
+    Filters are cached, so every page of a crawl (and every parse worker
+    process) reuses the same one.
+    """
+    return _make_link_filter(base_url, tuple(exclude_patterns or ()))
+
+@lru_cache(maxsize=32)
+def _make_link_filter(base_url: str, exclude_patterns: Tuple[str, ...]) -> Callable[[Iterable[str]], Set[str]]:
+    # Work that doesn't depend on the link is done once per filter; the host
+    # is taken from the canonical base URL so a default port (:80, :443) in the
+    # start URL doesn't keep the prefixes from matching canonical links
+    base_domain = get_domain(canonicalize_url(base_url))
+    # Canonical URLs always spell out scheme://host/, so the host can be
+    # checked with a prefix match instead of parsing the URL again
+    same_domain_prefixes = (f'http://{base_domain}/', f'https://{base_domain}/')
+    same_host_prefixes = (f'http://{base_domain}', f'https://{base_domain}', f'//{base_domain}')
+    exclude_re = compile_exclude_patterns(exclude_patterns)
+    
+    def link_filter(links: Iterable[str]) -> Set[str]:
+        normalized_links = set()
         
-        # Skip resource URLs and only keep links from the same domain
-        link_domain = normalize_domain(parsed_link.netloc)
-        base_domain = normalize_domain(domain)
-        if not is_resource_url(clean_url) and link_domain == base_domain:
-            # Keep original scheme
-            normalized_links.add(clean_url)
+        # Links that differ only by fragment canonicalize to the same URL, so
+        # drop fragments first and handle each remaining link once. Empty
+        # links are skipped; a bare fragment becomes '' and resolves to the
+        # base URL as before
+        for link in {link.partition('#')[0] for link in links if link}:
+            # Reject absolute links to other hosts and non-web links before
+            # paying for joining and canonicalizing them
+            lowered = link.lower()
+            # Protocol-relative links (//host/path) name a host too, unless the
+            # host is empty and urljoin falls back to the base URL's
+            names_host = lowered.startswith(_WEB_SCHEMES) or (
+                lowered.startswith('//') and lowered[2:3] not in ('', '/', '?'))
+            if names_host:
+                if not lowered.startswith(same_host_prefixes):
+                    continue
+            elif lowered.startswith(_NON_WEB_SCHEMES):
+                continue
+                
+            # Convert relative to absolute URL, then canonicalize so the link
+            # matches the tracker's keys (this also lowercases the host)
+            clean_url = canonicalize_url(urljoin(base_url, link))
+            
+            # Only keep web links from the same domain, cheapest check first
+            if not clean_url.startswith(same_domain_prefixes):
+                continue
             
-    return normalized_links
\ No newline at end of file
+            # Skip URLs matching exclude patterns; the path runs from the slash
+            # after the host up to the query, so it is sliced out, not reparsed
+            if exclude_re is not None:
+                path = clean_url[clean_url.find('/', clean_url.index('//') + 2):].partition('?')[0]
+                if exclude_re.search(path):
+                    continue
+            
+            # Skip resource URLs
+            if not is_resource_url(clean_url):
+                # Keep original scheme
+                normalized_links.add(clean_url)
+                
+        return normalized_links
+    
+    return link_filter
+
+
+_TOKEN_RE = re.compile(r'\w+')
+
+def simhash(text: str) -> int:
+    """Compute a 64-bit SimHash fingerprint over the word tokens of a document"""
+    votes = [0] * 64
+    for token, weight in Counter(_TOKEN_RE.findall(text.lower())).items():
+        token_hash = int.from_bytes(blake2b(token.encode(), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            votes[bit] += weight if token_hash >> bit & 1 else -weight
+    fingerprint = 0
+    for bit, vote in enumerate(votes):
+        if vote > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def hamming_distance(a: int, b: int) -> int:
+    """Count the differing bits between two fingerprints"""
+    return bin(a ^ b).count('1')
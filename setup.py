@@ -1,8 +1,21 @@
+import os
 from setuptools import setup, find_packages
 
 with open("README.md", "r", encoding="utf-8") as fh:
     long_description = fh.read()
 
+# Optionally compile the pure-Python URL helpers to a C extension with
+# mypyc (requires mypy at build time); the package works the same without
+ext_modules = []
+if os.environ.get("SCRAPFLY_MYPYC") == "1":
+    from mypyc.build import mypycify
+    # Only utils.py is compiled; the rest of the package is merely imported
+    ext_modules = mypycify([
+        "--ignore-missing-imports",
+        "--follow-imports=silent",
+        "scrapfly_crawler/utils.py",
+    ])
+
 setup(
     name="scrapfly-crawler",
     version="0.1.0",
@@ -13,6 +26,7 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/robertDouglass/scrapfly-crawler",
     packages=find_packages(),
+    ext_modules=ext_modules,
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
@@ -31,11 +45,15 @@ setup(
         "scrapfly-sdk>=0.8.5",
         "python-dotenv>=0.19.0",
         "aiohttp>=3.8.0",
+        "requests>=2.25.0",
         "parsel>=1.8.1",
+        "lxml>=4.6.0",
+        "orjson>=3.6.0",
+        'uvloop>=0.18.0; platform_system != "Windows" and python_version >= "3.8"',
     ],
     entry_points={
         "console_scripts": [
-            "scrapfly-crawler=scrapfly_crawler.cli:main",
+            "scrapfly-crawler=scrapfly_crawler.cli:run",
         ],
     },
 )
\ No newline at end of file